@@ -66,48 +66,295 @@ this is found by removing the differing character from either ID, producing
 fgij.)
 """
 
+import collections
+from concurrent import futures
+import functools
+import itertools
+import mmap
+import os
+import sys
+import tempfile
+import zlib
 
-def process(line):
-  freq = {}
-  for c in line:
-    freq[c] = line.count(c)
+import numpy as np
 
-  counts = freq.values()
-  two = 1 if 2 in counts else 0
-  three = 1 if 3 in counts else 0
+# Record spilled by the sharded runner for every masked ID: the crc32 of the
+# masked ID, the masked position, and the length and file offset of the ID.
+SPILL_DTYPE = np.dtype([("key", np.uint32), ("position", np.uint16),
+                        ("length", np.uint16), ("offset", np.uint64)])
+# Upper bound on the spilled records held in memory by each reducer.
+PARTITION_BYTES = 1 << 27
 
-  return two, three
 
+def find_near_duplicates(data):
+  """Finds all pairs of IDs which differ by exactly one character."""
+  buckets = collections.defaultdict(list)
+  for box_id in dict.fromkeys(data):
+    for i in range(len(box_id)):
+      buckets[i, box_id[:i] + box_id[i + 1:]].append(box_id)
 
-def naive_find_common(data):
-  for left in data:
-    for right in data:
-      if left == right:
-        continue
-      diff_len = 0
-      common = []
-      for l, r in zip(left, right):
-        if l != r:
-          diff_len += 1
-        else:
-          common.append(l)
-      if diff_len == 1:
-        return "".join(common)
+  pairs = []
+  for bucket in buckets.values():
+    pairs.extend(itertools.combinations(bucket, 2))
+  return pairs
 
 
-if __name__ == "__main__":
-  with open("input/02") as file_:
-    data = file_.read().strip().split("\n")
+def common_letters(left, right):
+  return "".join(l for l, r in zip(left, right) if l == r)
+
+
+def to_matrix(data):
+  """Packs the IDs into the rows of a uint8 array, zero padding short IDs."""
+  width = max(len(box_id) for box_id in data)
+  packed = "".join(box_id.ljust(width, "\0") for box_id in data).encode()
+  return np.frombuffer(packed, dtype=np.uint8).reshape(len(data), width)
+
+
+def batch_counts(ids, chunk_size=1 << 16):
+  """Counts the IDs with any letter exactly two and exactly three times."""
+  # Map every letter to a dense column so the per-row histograms stay small.
+  # Padding goes to the last column, which is dropped.
+  present = np.zeros(256, dtype=bool)
+  present[ids.ravel()] = True
+  present[0] = False
+  num_letters = np.count_nonzero(present)
+  columns = np.where(present, np.cumsum(present) - 1, num_letters)
 
-  # Part 1.
-  processed = [process(line) for line in data]
   twos = 0
   threes = 0
-  for two, three in processed:
-    twos += two
-    threes += three
+  for start in range(0, len(ids), chunk_size):
+    chunk = columns[ids[start:start + chunk_size]]
+    rows = np.arange(len(chunk))[:, None] * (num_letters + 1)
+    histograms = np.bincount((rows + chunk).ravel(),
+                             minlength=len(chunk) * (num_letters + 1))
+    histograms = histograms.reshape(len(chunk), -1)[:, :-1]
+    twos += np.count_nonzero(np.any(histograms == 2, axis=1))
+    threes += np.count_nonzero(np.any(histograms == 3, axis=1))
+  return twos, threes
+
+
+def hamming_distance(left, right):
+  return sum(l != r for l, r in zip(left, right))
+
+
+def find_within_distance(data, k):
+  """Finds all pairs of equal length IDs within Hamming distance k."""
+  # By the pigeonhole principle, two IDs within distance k which are split into
+  # k + 1 segments match exactly on at least one segment.
+  box_ids = list(dict.fromkeys(data))
+  buckets = collections.defaultdict(list)
+  for i, box_id in enumerate(box_ids):
+    size = len(box_id)
+    bounds = [size * s // (k + 1) for s in range(k + 2)]
+    for s in range(k + 1):
+      buckets[size, s, box_id[bounds[s]:bounds[s + 1]]].append(i)
+
+  candidates = set()
+  for bucket in buckets.values():
+    candidates.update(itertools.combinations(bucket, 2))
+
+  pairs = []
+  for i, j in sorted(candidates):
+    left, right = box_ids[i], box_ids[j]
+    if hamming_distance(left, right) <= k:
+      pairs.append((left, right))
+  return pairs
+
+
+def blocked_find_within_distance(ids, k=1, block_size=128):
+  """Finds all pairs of ID rows within distance k by brute force in blocks.
+
+  Padding counts as a mismatch, so IDs of different lengths are also compared.
+  Peak memory is bounded by block_size * block_size * ids.shape[1] bytes.
+  """
+  pairs = []
+  for i in range(0, len(ids), block_size):
+    block_a = ids[i:i + block_size]
+    for j in range(i, len(ids), block_size):
+      block_b = ids[j:j + block_size]
+      mismatches = np.sum(block_a[:, None, :] != block_b[None, :, :], axis=2,
+                          dtype=np.uint16)
+      rows, cols = np.nonzero(mismatches <= k)
+      rows += i
+      cols += j
+      upper = rows < cols
+      pairs.extend(zip(rows[upper].tolist(), cols[upper].tolist()))
+  return pairs
+
+
+def _shard_bounds(path, num_shards):
+  """Splits the file into roughly equal byte ranges ending on line breaks."""
+  if not os.path.getsize(path):
+    return []
+  with open(path, "rb") as file_:
+    with mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+      size = len(mapped)
+      bounds = [0]
+      for shard in range(1, num_shards):
+        newline = mapped.find(b"\n", max(size * shard // num_shards,
+                                         bounds[-1]))
+        if newline == -1:
+          break
+        bounds.append(newline + 1)
+  bounds.append(size)
+  return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+
+def _read_batches(path, start, end, batch_size=1 << 14):
+  """Yields batches of (offset, ID) pairs from the byte range of the file."""
+  with open(path, "rb") as file_:
+    with mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+      batch = []
+      while start < end:
+        newline = mapped.find(b"\n", start, end)
+        if newline == -1:
+          newline = end
+        box_id = mapped[start:newline].rstrip()
+        if box_id:
+          batch.append((start, box_id))
+        if len(batch) == batch_size:
+          yield batch
+          batch = []
+        start = newline + 1
+      if batch:
+        yield batch
+
+
+def _count_shard(shard):
+  twos = 0
+  threes = 0
+  for batch in _read_batches(*shard):
+    batch_twos, batch_threes = batch_counts(
+        to_matrix([box_id.decode() for _, box_id in batch]))
+    twos += batch_twos
+    threes += batch_threes
+  return twos, threes
+
+
+def _spill_path(directory, shard, partition):
+  return os.path.join(directory, "shard%d-partition%d" % (shard, partition))
+
+
+def _map_shard(shard, index, directory, num_partitions):
+  """Spills a record for every masked ID in the shard to its key's partition.
+
+  Records are fixed width and point back into the file rather than copying the
+  ID, so they never pass through the parent process.
+  """
+  spills = [open(_spill_path(directory, index, partition), "wb")
+            for partition in range(num_partitions)]
+  try:
+    for batch in _read_batches(*shard):
+      lengths = np.array([len(box_id) for _, box_id in batch], dtype=np.uint16)
+      records = np.zeros(int(np.sum(lengths, dtype=np.int64)),
+                         dtype=SPILL_DTYPE)
+      # Python's str hash differs between processes, so use a stable one.
+      records["key"] = np.fromiter(
+          (zlib.crc32(box_id[:i] + box_id[i + 1:], i)
+           for _, box_id in batch for i in range(len(box_id))),
+          dtype=np.uint32, count=len(records))
+      starts = np.cumsum(lengths, dtype=np.int64) - lengths
+      records["position"] = (np.arange(len(records)) -
+                             np.repeat(starts, lengths))
+      records["length"] = np.repeat(lengths, lengths)
+      records["offset"] = np.repeat(
+          np.array([offset for offset, _ in batch], dtype=np.uint64), lengths)
+
+      partitions = records["key"] % num_partitions
+      order = np.argsort(partitions, kind="stable")
+      bounds = np.searchsorted(partitions[order],
+                               np.arange(num_partitions + 1))
+      for partition, spill in enumerate(spills):
+        records[order[bounds[partition]:bounds[partition + 1]]].tofile(spill)
+  finally:
+    for spill in spills:
+      spill.close()
+
+
+def _reduce_partition(partition, path, directory, num_shards):
+  """Finds the near duplicates among the records spilled to the partition.
+
+  Records are sorted on their key and only records sharing a key are compared
+  exactly, since different IDs may still collide on the crc32.
+  """
+  records = np.concatenate([
+      np.fromfile(_spill_path(directory, shard, partition), dtype=SPILL_DTYPE)
+      for shard in range(num_shards)] + [np.zeros(0, dtype=SPILL_DTYPE)])
+  records = records[np.argsort(records["key"])]
+  keys = records["key"]
+  starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+  counts = np.diff(np.append(starts, len(keys)))
+  shared = counts > 1
+  if not np.any(shared):
+    return []
+
+  pairs = []
+  with open(path, "rb") as file_:
+    with mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+      for start, count in zip(starts[shared], counts[shared]):
+        buckets = collections.defaultdict(dict)
+        for _, i, length, offset in records[start:start + count].tolist():
+          box_id = mapped[offset:offset + length].decode()
+          buckets[i, box_id[:i] + box_id[i + 1:]][box_id] = None
+        for bucket in buckets.values():
+          pairs.extend(itertools.combinations(bucket, 2))
+  return pairs
+
+
+def sharded_run(path, num_workers=None, num_partitions=None):
+  """Computes both parts over a memory-mapped ID file with a process pool.
+
+  Returns the two and three letter counts and all near duplicate pairs. By
+  default there are enough partitions for each reducer to hold at most
+  PARTITION_BYTES of spilled records.
+  """
+  num_workers = num_workers or os.cpu_count()
+  if num_partitions is None:
+    # Every byte of the file spills at most one record.
+    spilled = os.path.getsize(path) * SPILL_DTYPE.itemsize
+    num_partitions = max(num_workers, -(-spilled // PARTITION_BYTES))
+  bounds = _shard_bounds(path, num_workers)
+  shards = [(path, start, end) for start, end in bounds]
+  with futures.ProcessPoolExecutor(num_workers) as pool:
+    twos = 0
+    threes = 0
+    for shard_twos, shard_threes in pool.map(_count_shard, shards):
+      twos += shard_twos
+      threes += shard_threes
+
+    with tempfile.TemporaryDirectory() as directory:
+      map_shard = functools.partial(_map_shard, directory=directory,
+                                    num_partitions=num_partitions)
+      list(pool.map(map_shard, shards, range(len(shards))))
+      reduce_partition = functools.partial(_reduce_partition, path=path,
+                                           directory=directory,
+                                           num_shards=len(shards))
+      pairs = []
+      for partition_pairs in pool.map(reduce_partition,
+                                      range(num_partitions)):
+        pairs.extend(partition_pairs)
+  return int(twos), int(threes), pairs
+
+
+if __name__ == "__main__":
+  # Usage: [path] [--sharded], where --sharded runs over all cores and keeps
+  # the file memory-mapped rather than reading it into memory.
+  args = sys.argv[1:]
+  sharded = "--sharded" in args
+  paths = [arg for arg in args if arg != "--sharded"]
+  path = paths[0] if paths else "input/02"
+
+  if sharded:
+    twos, threes, pairs = sharded_run(path)
+  else:
+    with open(path) as file_:
+      data = file_.read().strip().split("\n")
+    twos, threes = batch_counts(to_matrix(data))
+    pairs = find_near_duplicates(data)
+
+  # Part 1.
   print("Checksum:", twos * threes)
 
   # Part 2.
-  common = naive_find_common(data)
-  print("Common Letters:", common)
+  for left, right in pairs:
+    print("Common Letters:", common_letters(left, right))
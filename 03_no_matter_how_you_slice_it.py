@@ -67,27 +67,415 @@ made.
 What is the ID of the only claim that doesn't overlap?
 """
 
+from concurrent import futures
+from multiprocessing import shared_memory
+import os
+import re
+
 import numpy as np
 
+CLAIM_RE = re.compile(r'#(\d+) @ (\d+),(\d+): (\d+)x(\d+)')
+
+# Claims spanning more square inches than this are handled by the sweep line.
+MAX_CLOTH_AREA = 1 << 28
+
+
+def parse_claims(text):
+  """Parses all claims into an (N, 5) array of id, x, y, w, h rows."""
+  return np.array(CLAIM_RE.findall(text), dtype=np.int32).reshape(-1, 5)
+
+
+def _diff_dtype(num_claims):
+  """Finds the smallest signed dtype which can hold the running counts."""
+  if num_claims <= np.iinfo(np.int16).max:
+    return np.int16
+  return np.int32
+
+
+def _count_dtype(max_count):
+  """Finds the smallest unsigned dtype for the counts, saturating if needed."""
+  if max_count <= np.iinfo(np.uint8).max:
+    return np.uint8
+  return np.uint16
+
+
+def _bounds(claims):
+  """Finds the top left corner and the shape of the claims' bounding box."""
+  _, x, y, w, h = claims.T
+  origin = (int(np.min(x)), int(np.min(y)))
+  shape = (int(np.max(x + w)) - origin[0], int(np.max(y + h)) - origin[1])
+  return origin, shape
+
+
+def _add_corners(diff, claims, origin):
+  _, x, y, w, h = claims.T
+  x = x - origin[0]
+  y = y - origin[1]
+  np.add.at(diff, (x, y), 1)
+  np.add.at(diff, (x + w, y), -1)
+  np.add.at(diff, (x, y + h), -1)
+  np.add.at(diff, (x + w, y + h), 1)
+
+
+def _integrate(diff):
+  """Turns the difference array into compact counts, in place."""
+  np.cumsum(diff, axis=0, out=diff)
+  np.cumsum(diff, axis=1, out=diff)
+  counts = diff[:-1, :-1]
+
+  max_count = np.max(counts, initial=0)
+  dtype = _count_dtype(max_count)
+  if max_count > np.iinfo(dtype).max:
+    counts = np.minimum(counts, np.iinfo(dtype).max)
+  return counts.astype(dtype)
+
+
+def accumulate(claims):
+  """Counts the claims covering each square inch of the cloth.
+
+  The cloth only spans the bounding box of the claims, whose top left corner is
+  returned as the origin. Only the four corners of each claim are written into
+  a difference array, so the cost does not depend on how large the claims are.
+  """
+  origin, shape = _bounds(claims)
+  diff = np.zeros((shape[0] + 1, shape[1] + 1), dtype=_diff_dtype(len(claims)))
+  _add_corners(diff, claims, origin)
+  return _integrate(diff), origin
+
+
+def _contested_table(cloth):
+  """Computes the summed area table of the cloth > 1 mask."""
+  table = np.zeros((cloth.shape[0] + 1, cloth.shape[1] + 1), dtype=np.int32)
+  np.cumsum(np.cumsum(cloth > 1, axis=0, dtype=np.int32), axis=1,
+            out=table[1:, 1:])
+  return table
+
+
+def _rect_sums(table, origin, rects):
+  x, y, w, h = np.asarray(rects, dtype=np.int64).T
+  x = x - origin[0]
+  y = y - origin[1]
+  rows, cols = table.shape
+  x0, x1 = np.clip(x, 0, rows - 1), np.clip(x + w, 0, rows - 1)
+  y0, y1 = np.clip(y, 0, cols - 1), np.clip(y + h, 0, cols - 1)
+  return table[x1, y1] - table[x0, y1] - table[x1, y0] + table[x0, y0]
+
+
+class ContestedAreaIndex(object):
+  """Answers how many square inches within a rectangle are contested.
+
+  Built on the summed area table of the cloth > 1 mask, so every rectangle
+  takes four lookups. Rectangles are clipped to the cloth.
+  """
+
+  def __init__(self, cloth, origin=(0, 0)):
+    self._origin = origin
+    self._table = _contested_table(cloth)
+
+  def query(self, x, y, w, h):
+    return int(self.query_batch(np.array([[x, y, w, h]]))[0])
+
+  def query_batch(self, rects):
+    """Queries an (N, 4) array of x, y, w, h rectangles at once."""
+    return _rect_sums(self._table, self._origin, rects)
+
+
+def intact_claims(cloth, origin, claims):
+  """Finds the ids of the claims which do not overlap any other claim."""
+  contested = ContestedAreaIndex(cloth, origin).query_batch(claims[:, 1:])
+  return claims[contested == 0, 0]
+
+
+def _accumulate_shard(shard):
+  name, shape, dtype, index, claims, origin = shard
+  memory = shared_memory.SharedMemory(name=name)
+  partials = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+  _add_corners(partials[index], claims, origin)
+  del partials  # Views must be released before the memory is closed.
+  memory.close()
+
+
+def _intact_shard(shard):
+  name, shape, origin, claims = shard
+  memory = shared_memory.SharedMemory(name=name)
+  table = np.ndarray(shape, dtype=np.int32, buffer=memory.buf)
+  intact = claims[_rect_sums(table, origin, claims[:, 1:]) == 0, 0]
+  del table  # Views must be released before the memory is closed.
+  memory.close()
+  return intact
+
+
+def parallel_accumulate(claims, num_workers=None):
+  """Same as accumulate, with the claims split across a process pool.
+
+  Every worker writes the corners of its claims into its own partial difference
+  array in shared memory. The partials are then summed and integrated.
+  """
+  num_workers = num_workers or os.cpu_count()
+  origin, shape = _bounds(claims)
+  dtype = np.dtype(_diff_dtype(len(claims)))
+  shape = (num_workers, shape[0] + 1, shape[1] + 1)
+  memory = shared_memory.SharedMemory(
+      create=True, size=int(np.prod(shape)) * dtype.itemsize)
+  try:
+    partials = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+    partials[:] = 0
+    shards = [(memory.name, shape, dtype, i, chunk, origin)
+              for i, chunk in enumerate(np.array_split(claims, num_workers))]
+    with futures.ProcessPoolExecutor(num_workers) as pool:
+      list(pool.map(_accumulate_shard, shards))
+    diff = np.sum(partials, axis=0, dtype=dtype)
+    del partials
+  finally:
+    memory.close()
+    memory.unlink()
+  return _integrate(diff), origin
+
+
+def parallel_intact_claims(cloth, origin, claims, num_workers=None):
+  """Same as intact_claims, with the claims split across a process pool."""
+  num_workers = num_workers or os.cpu_count()
+  table = _contested_table(cloth)
+  memory = shared_memory.SharedMemory(create=True, size=table.nbytes)
+  try:
+    np.ndarray(table.shape, dtype=table.dtype, buffer=memory.buf)[:] = table
+    shards = [(memory.name, table.shape, origin, chunk)
+              for chunk in np.array_split(claims, num_workers)]
+    with futures.ProcessPoolExecutor(num_workers) as pool:
+      intact = list(pool.map(_intact_shard, shards))
+  finally:
+    memory.close()
+    memory.unlink()
+  return np.concatenate(intact)
+
+
+class _CoverageTree(object):
+  """Segment tree tracking the length covered once and twice over the ys."""
+
+  def __init__(self, ys):
+    self._ys = ys
+    self._size = len(ys) - 1
+    self._count = [0] * (4 * self._size + 2)
+    self._once = [0] * (4 * self._size + 2)
+    self._twice = [0] * (4 * self._size + 2)
+
+  @property
+  def twice(self):
+    return self._twice[1]
+
+  def add(self, lo, hi, delta):
+    self._add(1, 0, self._size, lo, hi, delta)
+
+  def _add(self, node, left, right, lo, hi, delta):
+    if hi <= left or right <= lo:
+      return
+    if lo <= left and right <= hi:
+      self._count[node] += delta
+    else:
+      mid = (left + right) // 2
+      self._add(2 * node, left, mid, lo, hi, delta)
+      self._add(2 * node + 1, mid, right, lo, hi, delta)
+
+    full = self._ys[right] - self._ys[left]
+    leaf = right - left == 1
+    once = 0 if leaf else self._once[2 * node] + self._once[2 * node + 1]
+    twice = 0 if leaf else self._twice[2 * node] + self._twice[2 * node + 1]
+    if self._count[node] >= 2:
+      once = twice = full
+    elif self._count[node] == 1:
+      once, twice = full, once
+    self._once[node] = once
+    self._twice[node] = twice
+
+
+class _MaxTree(object):
+  """Segment tree over the ys with range additions and range maximums.
+
+  Implemented bottom up without recursion. Additions covering a whole node are
+  kept at that node and only pushed down to its children before queries.
+  """
+
+  def __init__(self, size):
+    self._height = max(1, size - 1).bit_length()
+    self._leaves = 1 << self._height
+    self._best = [0] * (2 * self._leaves)
+    self._pending = [0] * self._leaves
+
+  def _apply(self, node, delta):
+    self._best[node] += delta
+    if node < self._leaves:
+      self._pending[node] += delta
+
+  def _rebuild(self, node):
+    best, pending = self._best, self._pending
+    while node > 1:
+      node >>= 1
+      best[node] = max(best[2 * node], best[2 * node + 1]) + pending[node]
+
+  def _push(self, node):
+    for shift in range(self._height, 0, -1):
+      parent = node >> shift
+      if self._pending[parent]:
+        self._apply(2 * parent, self._pending[parent])
+        self._apply(2 * parent + 1, self._pending[parent])
+        self._pending[parent] = 0
+
+  def add(self, lo, hi, delta):
+    lo += self._leaves
+    hi += self._leaves
+    first, last = lo, hi - 1
+    while lo < hi:
+      if lo & 1:
+        self._apply(lo, delta)
+        lo += 1
+      if hi & 1:
+        hi -= 1
+        self._apply(hi, delta)
+      lo >>= 1
+      hi >>= 1
+    self._rebuild(first)
+    self._rebuild(last)
+
+  def max(self, lo, hi):
+    lo += self._leaves
+    hi += self._leaves
+    self._push(lo)
+    self._push(hi - 1)
+    best = float('-inf')
+    while lo < hi:
+      if lo & 1:
+        best = max(best, self._best[lo])
+        lo += 1
+      if hi & 1:
+        hi -= 1
+        best = max(best, self._best[hi])
+      lo >>= 1
+      hi >>= 1
+    return best
+
+
+class _IntervalTree(object):
+  """Segment tree storing intervals over the ys for overlap queries.
+
+  Every interval is stored at the O(log n) nodes which exactly cover it. Each
+  node also counts the intervals in its subtree so queries skip empty ones.
+  """
+
+  def __init__(self, size):
+    self._size = size
+    self._stored = [set() for _ in range(4 * size + 2)]
+    self._total = [0] * (4 * size + 2)
+
+  def insert(self, lo, hi, key):
+    self._update(1, 0, self._size, lo, hi, key, set.add)
+
+  def remove(self, lo, hi, key):
+    self._update(1, 0, self._size, lo, hi, key, set.discard)
+
+  def overlapping(self, lo, hi):
+    found = set()
+    self._query(1, 0, self._size, lo, hi, found)
+    return found
+
+  def _update(self, node, left, right, lo, hi, key, op):
+    if hi <= left or right <= lo:
+      return
+    if lo <= left and right <= hi:
+      op(self._stored[node], key)
+    else:
+      mid = (left + right) // 2
+      self._update(2 * node, left, mid, lo, hi, key, op)
+      self._update(2 * node + 1, mid, right, lo, hi, key, op)
+    self._total[node] = len(self._stored[node])
+    if right - left > 1:
+      self._total[node] += self._total[2 * node] + self._total[2 * node + 1]
+
+  def _query(self, node, left, right, lo, hi, found):
+    if hi <= left or right <= lo or not self._total[node]:
+      return
+    found.update(self._stored[node])
+    if right - left > 1:
+      mid = (left + right) // 2
+      self._query(2 * node, left, mid, lo, hi, found)
+      self._query(2 * node + 1, mid, right, lo, hi, found)
+
+
+def _compress(claims):
+  """Maps the y edges of the claims onto indices of the sorted unique ys."""
+  _, _, y, _, h = claims.T
+  ys = np.unique(np.concatenate([y, y + h]))
+  lo = np.searchsorted(ys, y).tolist()
+  hi = np.searchsorted(ys, y + h).tolist()
+  return ys.tolist(), lo, hi
+
+
+def sweep_overlap_area(claims):
+  """Finds the area within two or more claims without a dense cloth."""
+  ys, lo, hi = _compress(claims)
+  _, x, _, w, _ = claims.T.tolist()
+  events = sorted([(x[i], 1, lo[i], hi[i]) for i in range(len(claims))] +
+                  [(x[i] + w[i], -1, lo[i], hi[i]) for i in range(len(claims))])
+
+  tree = _CoverageTree(ys)
+  area = 0
+  prev_x = events[0][0]
+  for event_x, delta, event_lo, event_hi in events:
+    area += tree.twice * (event_x - prev_x)
+    tree.add(event_lo, event_hi, delta)
+    prev_x = event_x
+  return area
+
+
+def sweep_intact_claims(claims):
+  """Finds the ids of the intact claims without a dense cloth."""
+  ys, lo, hi = _compress(claims)
+  _, x, _, w, _ = claims.T.tolist()
+  # Claims ending at some x are removed before the ones starting at it. Empty
+  # claims never overlap anything so they are left out of the sweep.
+  nonempty = [i for i in range(len(claims)) if w[i] and lo[i] < hi[i]]
+  events = sorted([(x[i] + w[i], 0, i) for i in nonempty] +
+                  [(x[i], 1, i) for i in nonempty])
+
+  # The max tree counts the active claims over every y, which tells whether a
+  # new claim overlaps anything. Only active claims not yet known to overlap
+  # are kept in the interval tree, and they leave it the first time a query
+  # finds them, so each claim is reported at most once.
+  active = _MaxTree(len(ys) - 1)
+  unmarked = _IntervalTree(len(ys) - 1)
+  overlapped = np.zeros(len(claims), dtype=bool)
+  for _, start, i in events:
+    if not start:
+      active.add(lo[i], hi[i], -1)
+      if not overlapped[i]:
+        unmarked.remove(lo[i], hi[i], i)
+      continue
+    if active.max(lo[i], hi[i]) > 0:
+      overlapped[i] = True
+      for j in unmarked.overlapping(lo[i], hi[i]):
+        overlapped[j] = True
+        unmarked.remove(lo[j], hi[j], j)
+    else:
+      unmarked.insert(lo[i], hi[i], i)
+    active.add(lo[i], hi[i], 1)
+  return claims[~overlapped, 0]
+
 if __name__ == '__main__':
-  cloth = np.zeros((1000, 1000))
-  claims = []
   with open('input/03') as file_:
-    lines = file_.readlines()
-    for line in lines:
-      _, _, loc, size = line.split()
-      x, y = [int(t) for t in loc[:-1].split(',')]  # Remove token then split.
-      w, h = [int(t) for t in size.split('x')]
-      claims.append((x, y, w, h))
-      cloth[x:x + w, y:y + h] += 1
+    claims = parse_claims(file_.read())
+
+  _, x, y, w, h = claims.T.astype(np.int64)
+  dense = (np.max(x + w) - np.min(x)) * (np.max(y + h) - np.min(y))
+  if dense <= MAX_CLOTH_AREA:
+    cloth, origin = accumulate(claims)
+    overlap = np.count_nonzero(cloth > 1)
+    intact = intact_claims(cloth, origin, claims)
+  else:
+    overlap = sweep_overlap_area(claims)
+    intact = sweep_intact_claims(claims)
 
   # Part 1.
-  overlap = len(cloth[cloth > 1])
   print('Overlapping Area (in^2):', overlap)
 
   # Part 2.
-  for i, claim in enumerate(claims):
-    x, y, w, h = claim
-    area = w * h
-    if np.sum(cloth[x:x + w, y:y + h]) == area:
-      print('Intact Claim #:', i + 1)
+  for claim_id in intact:
+    print('Intact Claim #:', claim_id)
@@ -91,56 +91,318 @@ What is the ID of the guard you chose multiplied by the minute you chose? (In
 the above example, the answer would be 99 * 45 = 4455.)
 """
 
-import collections
+import datetime
+import heapq
+import itertools
+import os
+import re
+import sys
+import tempfile
 
 import numpy as np
 
+RECORD_RE = re.compile(r'\[(\d+-\d+-\d+) (\d+):(\d+)\] '
+                       r'(?:Guard #(\d+) begins shift|(falls asleep)|wakes up)')
+BEGIN, ASLEEP, WAKE = 0, 1, 2
+RECORD_DTYPE = np.dtype([('minute', np.int64), ('event', np.int8),
+                         ('guard', np.int32)])
 
-def process_timestamp(string_timestamp):
-  return int(string_timestamp[-3:-1])
 
+class SleepMatrix(object):
+  """Counts how often each guard was asleep on each minute of the hour.
 
-if __name__ == '__main__':
-  guards = collections.defaultdict(lambda: np.zeros(60))
-  with open('input/04') as file_:
-    lines = file_.readlines()
-  lines = sorted(lines)
-
-  guard_id = None
-  asleep = None
-  for line in lines:
-    tokens = line.split()
-    if len(tokens) == 6:  # New guard begins shift.
-      _, _, _, guard_id, _, _ = tokens
-      guard_id = int(guard_id[1:])
+  Counts live in a single int32 matrix with one row per guard, which grows
+  geometrically as new guards show up.
+  """
+
+  def __init__(self, capacity=64):
+    self._rows = {}
+    self._counts = np.zeros((capacity, 60), dtype=np.int32)
+
+  @property
+  def guard_ids(self):
+    return np.array(list(self._rows), dtype=np.int32)
+
+  @property
+  def counts(self):
+    return self._counts[:len(self._rows)]
+
+  def _row(self, guard_id):
+    row = self._rows.get(guard_id)
+    if row is None:
+      row = len(self._rows)
+      if row == len(self._counts):
+        grown = np.zeros((2 * len(self._counts), 60), dtype=np.int32)
+        grown[:row] = self._counts
+        self._counts = grown
+      self._rows[guard_id] = row
+    return row
+
+  def add(self, guard_id, start, end):
+    row = self._row(guard_id)  # Might grow the counts.
+    self._counts[row, start:end] += 1
+
+  def add_intervals(self, guard_ids, starts, ends):
+    """Adds arrays of sleep intervals at once."""
+    unique_ids, inverse = np.unique(guard_ids, return_inverse=True)
+    rows = np.array([self._row(guard_id) for guard_id in unique_ids.tolist()],
+                    dtype=np.intp)[inverse]
+    diff = np.zeros((len(self._rows), 61), dtype=np.int32)
+    np.add.at(diff, (rows, starts), 1)
+    np.add.at(diff, (rows, ends), -1)
+    self.counts[:] += np.cumsum(diff, axis=1)[:, :-1]
+
+  def histogram(self, guard_id):
+    return self._counts[self._rows[guard_id]]
+
+  def top_guards(self, k=1):
+    """Finds the k guards which slept the most, with their total sleep.
+
+    Ties go to the lowest guard id, whatever order the guards were added in.
+    """
+    totals = np.sum(self.counts, axis=1)
+    guard_ids = self.guard_ids
+    rows = np.lexsort((guard_ids, -totals))[:k]
+    return [(int(guard_ids[row]), int(totals[row])) for row in rows]
+
+  def top_minutes(self, k=1):
+    """Finds the k (guard, minute) pairs slept the most, with their counts.
+
+    Ties go to the lowest guard id, then to the earliest minute.
+    """
+    flat = self.counts.ravel()
+    guard_ids = self.guard_ids
+    cells = np.lexsort((np.tile(np.arange(60), len(guard_ids)),
+                        np.repeat(guard_ids, 60), -flat))[:k]
+    return [(int(guard_ids[cell // 60]), int(cell % 60), int(flat[cell]))
+            for cell in cells]
+
+  def strategy_one(self):
+    (guard_id, _), = self.top_guards()
+    return guard_id * int(np.argmax(self.histogram(guard_id)))
+
+  def strategy_two(self):
+    (guard_id, minute, _), = self.top_minutes()
+    return guard_id * minute
+
+
+def ingest(text):
+  """Parses all records into a chronologically ordered structured array."""
+  matches = RECORD_RE.findall(text)
+  records = np.zeros(len(matches), dtype=RECORD_DTYPE)
+  if not matches:
+    return records
+  dates, hours, minutes, guards, asleep = zip(*matches)
+
+  days = np.array(dates, dtype='datetime64[D]').astype(np.int64)
+  records['minute'] = (days * 24 + np.array(hours, dtype=np.int64)) * 60
+  records['minute'] += np.array(minutes, dtype=np.int64)
+  guards = np.array([int(guard) if guard else -1 for guard in guards],
+                    dtype=np.int32)
+  records['guard'] = guards
+  records['event'] = np.where(guards >= 0, BEGIN,
+                              np.where(np.array(asleep) != '', ASLEEP, WAKE))
+  # Records at the same minute are ordered like the sorted log lines, i.e.
+  # shift begins before falls asleep before wakes up.
+  records = records[np.lexsort((records['event'], records['minute']))]
+
+  # Forward fill the guard on duty over the records following its shift.
+  on_duty = np.where(records['guard'] >= 0, np.arange(len(records)), 0)
+  np.maximum.accumulate(on_duty, out=on_duty)
+  records['guard'] = records['guard'][on_duty]
+  return records
+
+
+def sleep_matrix(records):
+  """Builds the SleepMatrix of the chronologically ordered records."""
+  # Every sleep interval is a falls asleep record directly followed by a wakes
+  # up record, both during the midnight hour.
+  intervals = ((records['event'][:-1] == ASLEEP) &
+               (records['event'][1:] == WAKE))
+  matrix = SleepMatrix()
+  matrix.add_intervals(records['guard'][:-1][intervals],
+                       records['minute'][:-1][intervals] % 60,
+                       records['minute'][1:][intervals] % 60)
+  return matrix
+
+
+def _write_runs(file_, directory, chunk_size):
+  """Sorts chunks of at most chunk_size lines into temporary run files."""
+  paths = []
+  while True:
+    chunk = [line.rstrip('\n') + '\n'
+             for line in itertools.islice(file_, chunk_size) if line.strip()]
+    if not chunk:
+      return paths
+    chunk.sort()
+    paths.append(os.path.join(directory, 'run%d' % len(paths)))
+    with open(paths[-1], 'w') as run:
+      run.writelines(chunk)
+
+
+def stream_sleep_matrix(path, chunk_size=1 << 20):
+  """Same as sleep_matrix, for log files which do not fit in memory.
+
+  The log is sorted externally: chunks of chunk_size lines are sorted into run
+  files, which are then merged while accumulating the sleep counts.
+  """
+  matrix = SleepMatrix()
+  with tempfile.TemporaryDirectory() as directory:
+    with open(path) as file_:
+      paths = _write_runs(file_, directory, chunk_size)
+    runs = [open(run_path) for run_path in paths]
+    try:
+      guard_id = None
       asleep = None
-    else:
-      _, timestamp, _, action = tokens
-      timestamp = process_timestamp(timestamp)
-      if action == 'asleep':
-        asleep = timestamp
-      elif action == 'up':
-        guards[guard_id][asleep:timestamp] += 1
-
-  guards = dict(guards)
-  guard_ids = []
-  shifts = []
-  for guard_id, shift in guards.items():
-    guard_ids.append(guard_id)
-    shifts.append(shift)
-
-  shifts = np.vstack(shifts)
+      for line in heapq.merge(*runs):
+        _, _, minute, guard, falls_asleep = RECORD_RE.match(line).groups()
+        if guard:
+          guard_id = int(guard)
+        elif falls_asleep:
+          asleep = int(minute)
+        else:
+          matrix.add(guard_id, asleep, int(minute))
+    finally:
+      for run in runs:
+        run.close()
+  return matrix
+
+
+class GuardMonitor(object):
+  """Keeps both strategy answers up to date as new records arrive.
+
+  Records may arrive out of order by up to window minutes. They are buffered
+  until no earlier record can arrive anymore, then applied in order.
+  """
+
+  def __init__(self, window=24 * 60):
+    self.matrix = SleepMatrix()
+    self._window = window
+    self._pending = []
+    self._num_received = 0
+    self._latest = None
+    self._applied = None
+    self._guard_id = None
+    self._asleep = None
+    self._totals = {}
+    self._most_asleep = None
+    self._most_asleep_minute = None
+
+  @property
+  def strategy_one(self):
+    if self._most_asleep is None:
+      return None
+    guard_id, _ = self._most_asleep
+    return guard_id * int(np.argmax(self.matrix.histogram(guard_id)))
+
+  @property
+  def strategy_two(self):
+    if self._most_asleep_minute is None:
+      return None
+    guard_id, minute, _ = self._most_asleep_minute
+    return guard_id * minute
+
+  def update(self, lines):
+    """Adds the new records and applies the ones outside of the window.
+
+    The whole batch is validated first: if any record is malformed or older
+    than the window, ValueError lists them and no record is added.
+    """
+    records = []
+    rejected = []
+    for line in lines:
+      if not line.strip():
+        continue
+      match = RECORD_RE.match(line)
+      if not match:
+        rejected.append(line)
+        continue
+      date, hour, minute, guard, falls_asleep = match.groups()
+      day = datetime.date.fromisoformat(date).toordinal()
+      timestamp = (day * 24 + int(hour)) * 60 + int(minute)
+      if self._applied is not None and timestamp < self._applied:
+        rejected.append(line)
+        continue
+      if guard:
+        records.append((timestamp, (BEGIN, int(guard))))
+      else:
+        records.append((timestamp, (ASLEEP if falls_asleep else WAKE, None)))
+    if rejected:
+      raise ValueError('Malformed records or records older than the window: '
+                       '%s' % [line.rstrip('\n') for line in rejected])
+
+    for timestamp, event in records:
+      # Records at the same minute are ordered like the sorted log lines, i.e.
+      # shift begins before falls asleep before wakes up.
+      heapq.heappush(self._pending,
+                     (timestamp, event[0], self._num_received, event))
+      self._num_received += 1
+      if self._latest is None or timestamp > self._latest:
+        self._latest = timestamp
+    if self._latest is not None:
+      self._apply(self._latest - self._window)
+    return self.strategy_one, self.strategy_two
+
+  def flush(self):
+    """Applies all buffered records, e.g. once the log is complete."""
+    if self._latest is not None:
+      self._apply(self._latest)
+    return self.strategy_one, self.strategy_two
+
+  def _apply(self, until):
+    while self._pending and self._pending[0][0] <= until:
+      timestamp, _, _, (event, guard_id) = heapq.heappop(self._pending)
+      self._applied = timestamp
+      if event == BEGIN:
+        self._guard_id = guard_id
+        self._asleep = None
+      elif event == ASLEEP:
+        self._asleep = timestamp % 60
+      elif self._guard_id is not None and self._asleep is not None:
+        # Wakes up records without a guard on duty or without a matching falls
+        # asleep record, e.g. when monitoring starts mid shift, are skipped.
+        self._add(self._guard_id, self._asleep, timestamp % 60)
+        self._asleep = None
+
+  def _add(self, guard_id, start, end):
+    """Adds the interval and updates the answers from the touched counts.
+
+    Counts only grow, so the answers either stay or move to the interval's
+    guard. Ties are broken as in SleepMatrix.top_guards and top_minutes.
+    """
+    self.matrix.add(guard_id, start, end)
+    total = self._totals.get(guard_id, 0) + end - start
+    self._totals[guard_id] = total
+    if (self._most_asleep is None or
+        (total, -guard_id) > (self._most_asleep[1], -self._most_asleep[0])):
+      self._most_asleep = (guard_id, total)
+
+    if start < end:
+      counts = self.matrix.histogram(guard_id)[start:end]
+      minute = start + int(np.argmax(counts))
+      count = int(counts[minute - start])
+      best = self._most_asleep_minute
+      if best is None or (count, -guard_id, -minute) > (best[2], -best[0],
+                                                        -best[1]):
+        self._most_asleep_minute = (guard_id, minute, count)
+
+if __name__ == '__main__':
+  # Usage: [path] [--stream], where --stream sorts the log externally so that
+  # it does not have to fit in memory.
+  args = sys.argv[1:]
+  stream = '--stream' in args
+  paths = [arg for arg in args if arg != '--stream']
+  path = paths[0] if paths else 'input/04'
+
+  if stream:
+    matrix = stream_sleep_matrix(path)
+  else:
+    with open(path) as file_:
+      records = ingest(file_.read())
+    matrix = sleep_matrix(records)
 
   # Part 1.
-  most_asleep = np.argmax(np.sum(shifts, axis=1))
-  most_asleep_id = guard_ids[most_asleep]
-  most_asleep_minute = np.argmax(shifts[most_asleep])
-  print('Guard most asleep id x minute most asleep:',
-        most_asleep_id * most_asleep_minute)
+  print('Guard most asleep id x minute most asleep:', matrix.strategy_one())
 
   # Part 2.
-  most_asleep = np.argmax(np.max(shifts, axis=1))
-  most_asleep_id = guard_ids[most_asleep]
-  most_asleep_minute = np.argmax(shifts[most_asleep])
-  print('Guard most asleep id x minute most asleep:',
-        most_asleep_id * most_asleep_minute)
+  print('Guard most asleep id x minute most asleep:', matrix.strategy_two())
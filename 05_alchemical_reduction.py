@@ -61,36 +61,122 @@ What is the length of the shortest polymer you can produce by removing all units
 of exactly one type and fully reacting the result?
 """
 
-import copy
+from concurrent import futures
+import functools
+import mmap
+import os
+
+
+def _react_into(stack, units):
+  for unit in units:
+    if stack and stack[-1] ^ unit == 32:
+      stack.pop()
+    else:
+      stack.append(unit)
 
 
 def react(polymer):
-  polymer = [c for c in polymer]
-  size = len(polymer)
+  """Fully reacts the polymer, processing each unit exactly once.
+
+  Units are kept on a stack; two units react when they only differ in the
+  case bit, i.e. when their XOR is 32.
+  """
+  if isinstance(polymer, str):
+    polymer = polymer.encode()
+  stack = bytearray()
+  _react_into(stack, polymer)
+  return stack
+
+
+def _read_chunks(path, chunk_size):
+  """Reads the polymer file through mmap in chunks, dropping whitespace."""
+  if not os.path.getsize(path):
+    return
+  with open(path, 'rb') as file_:
+    with mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+      for i in range(0, len(mapped), chunk_size):
+        yield mapped[i:i + chunk_size].translate(None, b' \t\r\n')
+
+
+def stream_react(path, chunk_size=1 << 20):
+  """Same as react, holding only a chunk and the unreacted residue."""
+  stack = bytearray()
+  for chunk in _read_chunks(path, chunk_size):
+    _react_into(stack, chunk)
+  return stack
+
+
+def stream_removal_lengths(path, chunk_size=1 << 20):
+  """Same as removal_lengths, in one pass with a stack per removed unit."""
+  stacks = {unit: bytearray() for unit in range(ord('A'), ord('Z') + 1)}
+  for chunk in _read_chunks(path, chunk_size):
+    for unit, stack in stacks.items():
+      _react_into(stack, chunk.translate(None, bytes([unit, unit + 32])))
+  return {chr(unit): len(stack) for unit, stack in stacks.items()}
+
+
+def merge(left, right):
+  """Merges two reacted polymers, cancelling units at the boundary."""
+  merged = bytearray(left)
   i = 0
-  while i < size - 1:
-    if abs(ord(polymer[i]) - ord(polymer[i + 1])) == 32:
-      del polymer[i], polymer[i]  # Delete current character and next character.
-      i -= 2
-      size -= 2
+  while merged and i < len(right) and merged[-1] ^ right[i] == 32:
+    merged.pop()
     i += 1
-  return polymer
+  merged += right[i:]
+  return merged
+
+
+def _merge_pair(pair):
+  return merge(*pair)
+
+
+def parallel_react(polymer, num_workers=None):
+  """Same as react, splitting the polymer across processes.
+
+  Every chunk is reacted on its own, after which adjacent chunks are merged
+  pairwise in a tree. Only units at a boundary can still react when merging.
+  """
+  if isinstance(polymer, str):
+    polymer = polymer.encode()
+  num_workers = num_workers or os.cpu_count()
+  size = max(1, -(-len(polymer) // num_workers))
+  with futures.ProcessPoolExecutor(num_workers) as pool:
+    chunks = [polymer[i:i + size] for i in range(0, len(polymer), size)]
+    reacted = list(pool.map(react, chunks))
+    while len(reacted) > 1:
+      pairs = list(zip(reacted[::2], reacted[1::2]))
+      merged = list(pool.map(_merge_pair, pairs))
+      if len(reacted) % 2:
+        merged.append(reacted[-1])
+      reacted = merged
+  return reacted[0] if reacted else bytearray()
+
+
+def _stripped_length(polymer, unit):
+  return len(react(polymer.translate(None, bytes([unit, unit + 32]))))
+
+
+def removal_lengths(polymer, num_workers=None):
+  """Finds the reacted length after removing each unit type.
+
+  Removals start from the reacted polymer, which reacts to the same result as
+  the raw one but is much shorter, and run in parallel across processes.
+  """
+  reacted = bytes(react(polymer))
+  units = range(ord('A'), ord('Z') + 1)
+  with futures.ProcessPoolExecutor(num_workers) as pool:
+    lengths = pool.map(functools.partial(_stripped_length, reacted), units)
+    return {chr(unit): length for unit, length in zip(units, lengths)}
 
 
 if __name__ == '__main__':
-  with open('input/05') as file_:
-    data = file_.read().strip()
+  reacted = stream_react('input/05')
 
   # Part 1.
-  print('Reacted polymer length: ', len(react(data)))
+  print('Reacted polymer length: ', len(reacted))
 
   # Part 2.
-  shortest_len = 1000000
-  for i in range(65, 65 + 26):
-    lower = chr(i)
-    upper = chr(i + 32)
-    stripped = data.replace(lower, '').replace(upper, '')
-    reacted_len = len(react(stripped))
-    if reacted_len < shortest_len:
-      shortest_len = reacted_len
-  print('Shortest stripped, reacted polymer:', shortest_len)
+  lengths = removal_lengths(reacted)
+  for unit, length in sorted(lengths.items()):
+    print('%s/%s: %d' % (unit, unit.lower(), length))
+  print('Shortest stripped, reacted polymer:', min(lengths.values()))
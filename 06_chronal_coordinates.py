@@ -114,6 +114,91 @@ import numpy as np
 from scipy import spatial
 from sklearn.metrics import pairwise
 
+# Bytes of distances computed at once, sized to stay within the L2 cache.
+BLOCK_BYTES = 1 << 18
+# Number of points from which the flood fill beats broadcasting.
+FLOOD_FILL_POINTS = 1000
+
+
+def _broadcast_areas(points, block_bytes):
+  """Labels blocks of rows by broadcasting distances to all points.
+
+  A location is tied when its second smallest distance equals its smallest one.
+  """
+  (x, y), (width, height) = np.min(points, axis=0), np.max(points, axis=0)
+  rows = np.arange(x, width + 1, dtype=np.int32)
+  cols = np.arange(y, height + 1, dtype=np.int32)
+  col_distances = np.abs(cols[:, None] - points[None, :, 1])
+
+  num_points = len(points)
+  areas = np.zeros(num_points + 1, dtype=np.int64)
+  block_rows = max(1, block_bytes // (4 * len(cols) * num_points))
+  for start in range(0, len(rows), block_rows):
+    block = rows[start:start + block_rows]
+    row_distances = np.abs(block[:, None] - points[None, :, 0])
+    distances = row_distances[:, None, :] + col_distances[None, :, :]
+    labels = np.argmin(distances, axis=2)
+    if num_points > 1:
+      nearest = np.partition(distances, 1, axis=2)
+      labels[nearest[..., 0] == nearest[..., 1]] = num_points  # Ties.
+    areas += np.bincount(labels.ravel(), minlength=num_points + 1)
+  return areas[:num_points]
+
+
+def flood_fill(points):
+  """Runs a breadth first search from all points over their bounding box.
+
+  Returns the owner and the distance of every location, where tied locations
+  are owned by len(points). A location is tied when it is first reached from
+  different owners, or from an already tied location.
+  """
+  (x, y), (width, height) = np.min(points, axis=0), np.max(points, axis=0)
+  rows, cols = width - x + 1, height - y + 1
+  num_points = len(points)
+  owners = np.full(rows * cols, -1, dtype=np.int32)
+  distances = np.full(rows * cols, -1, dtype=np.int32)
+  lowest = np.full(rows * cols, num_points, dtype=np.int32)
+  highest = np.full(rows * cols, -1, dtype=np.int32)
+
+  targets = (points[:, 0] - x) * cols + (points[:, 1] - y)
+  sources = np.arange(num_points, dtype=np.int32)
+  distance = 0
+  while len(targets):
+    # Only the owners of unvisited targets in this round are kept, and a
+    # target is owned outright when all of them agree.
+    unvisited = owners[targets] == -1
+    targets, sources = targets[unvisited], sources[unvisited]
+    np.minimum.at(lowest, targets, sources)
+    np.maximum.at(highest, targets, sources)
+    frontier = np.unique(targets)
+    owners[frontier] = np.where(lowest[frontier] == highest[frontier],
+                                lowest[frontier], num_points)
+    distances[frontier] = distance
+
+    row, col = np.divmod(frontier, cols)
+    neighbours = [(frontier - cols)[row > 0], (frontier + cols)[row < rows - 1],
+                  (frontier - 1)[col > 0], (frontier + 1)[col < cols - 1]]
+    owned = [owners[frontier][row > 0], owners[frontier][row < rows - 1],
+             owners[frontier][col > 0], owners[frontier][col < cols - 1]]
+    targets = np.concatenate(neighbours)
+    sources = np.concatenate(owned)
+    distance += 1
+  return owners.reshape(rows, cols), distances.reshape(rows, cols)
+
+
+def voronoi_areas(points, block_bytes=BLOCK_BYTES):
+  """Counts the grid locations closest to each point, ignoring ties.
+
+  The grid spans the bounding box of the points. Many points are handled by
+  the flood fill, whose cost does not depend on the number of points.
+  """
+  points = np.asarray(points, dtype=np.int32)
+  if len(points) < FLOOD_FILL_POINTS:
+    return _broadcast_areas(points, block_bytes)
+  owners, _ = flood_fill(points)
+  return np.bincount(owners.ravel(), minlength=len(points) + 1)[:len(points)]
+
+
 if __name__ == '__main__':
   with open('input/06') as file_:
     lines = file_.read().strip().split('\n')
@@ -122,18 +207,7 @@ if __name__ == '__main__':
     points = np.vstack(points)
 
   # Part 1.
-  areas = np.zeros(len(points))
-  x, y = np.min(points, axis=0)
-  width, height = np.max(points, axis=0)
-  # TODO(eugenhotaj): this can be vectorized to be faster; seems tedious.
-  for i in range(x, width):
-    for j in range(x, height):
-      distances = pairwise.manhattan_distances(points, [[i, j]])
-      min_dist = np.min(distances)
-      # Discard equidistant points from the area accumulation.
-      if len(distances[distances <= min_dist]) == 1:
-        idx = np.argmin(distances)
-        areas[idx] += 1
+  areas = voronoi_areas(points)
 
   # Discard the convex hull since these points will have infinite area.
   convex_hull = spatial.ConvexHull(points)
@@ -144,6 +218,8 @@ if __name__ == '__main__':
   print('Largest non-infinite area: ', max_area)
 
   # Part 2.
+  x, y = np.min(points, axis=0)
+  width, height = np.max(points, axis=0)
   grid = np.array(list(itertools.product(range(x, width), range(y, height))))
   distances = pairwise.manhattan_distances(grid, points)
   distances = np.sum(distances, axis=1)